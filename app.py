@@ -1,9 +1,21 @@
 import streamlit as st
 import openai
+import httpx
 import google.generativeai as genai
 import os
-import json
+import re
+import orjson
+import time
+import hashlib
+import threading
+from typing import Literal
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, ValidationError
+from google.api_core import exceptions as google_exceptions
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,15 +29,24 @@ load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 google_api_key = os.getenv("GOOGLE_API_KEY")
 
+# Optionally serve both advisors from one self-hosted OpenAI-compatible server (e.g. vLLM).
+# Both replies of a round then go over the same keep-alive connection pool, and the
+# server batches them together. Gemini is not used then; OpenAI still writes the summary.
+SELF_HOSTED_BASE_URL = os.getenv("DEBATE_LLM_BASE_URL")
+SELF_HOSTED_MODEL = os.getenv("DEBATE_LLM_MODEL", "meta-llama/Llama-3.1-70B-Instruct")
+
 # Check for API keys
-if not openai.api_key or not google_api_key:
-    st.error("API keys for OpenAI and Google Gemini are not set. Please set them in your environment variables.")
-    st.info("For local development, create a .env file with OPENAI_API_KEY and GOOGLE_API_KEY")
+# Gemini is not used with a self-hosted server, so only the OpenAI key (for the summary) is required then.
+required_keys = {"OPENAI_API_KEY": openai.api_key}
+if not SELF_HOSTED_BASE_URL:
+    required_keys["GOOGLE_API_KEY"] = google_api_key
+missing_keys = [name for name, value in required_keys.items() if not value]
+api_keys_configured = not missing_keys
+if not api_keys_configured:
+    st.error(f"API keys are not set: {', '.join(missing_keys)}. Please set them in your environment variables.")
+    st.info(f"For local development, create a .env file with {' and '.join(missing_keys)}")
     st.stop()
 
-if google_api_key:
-    genai.configure(api_key=google_api_key)
-
 # ---
 # App Configuration
 # ---
@@ -42,65 +63,361 @@ st.set_page_config(
 # ---
 
 NOVA_MODEL = "gpt-4-turbo"  # Using a more advanced model for Dr. Nova
+# Dr. Nova's model by round: early exploratory rounds use a faster, cheaper model, and the
+# last entry applies to every later round. A thin previous reply escalates to NOVA_MODEL.
+NOVA_MODELS = ["gpt-4o-mini", "gpt-4o-mini", NOVA_MODEL]
+NOVA_ESCALATION_MIN_CHARS = 200
 SAGE_MODEL = "gemini-1.5-pro-latest" # Using the latest Gemini Pro model for Dr. Sage
+SUMMARY_MODEL = "gpt-4o-mini" # Supports schema-constrained (structured) outputs
+# Transcripts longer than this (~4k tokens) are condensed round by round before summarizing.
+SUMMARY_COMPRESS_CHARS = 16_000
+
+# Submit the final summary through OpenAI's Batch API: half the price, but it completes
+# asynchronously (usually minutes, at most 24h), so the summary appears later.
+SUMMARY_VIA_BATCH = os.getenv("OPENAI_BATCH_SUMMARY", "").lower() in ("1", "true", "yes")
+BATCH_POLL_SECONDS = 10
 
 NOVA_CONCEDE = "I concede — Dr Sage’s argument prevails."
 SAGE_CONCEDE = "I concede — Dr Nova’s argument prevails."
 
+# Either of these in a reply ends the debate: a concession, or the idea being judged unviable.
+CONCEDE_RE = re.compile("|".join([re.escape(NOVA_CONCEDE), re.escape(SAGE_CONCEDE)]), re.IGNORECASE)
+UNVIABLE_RE = re.compile(r"\b(?:not viable|unviable)\b", re.IGNORECASE)
+
+# Request throttling, shared by every session in the process. Transient API errors
+# (rate limits, connection drops, 5xx) are retried with exponential backoff.
+def positive_int_setting(name, default):
+    """
+    Reads a whole-number setting of at least 1 from the environment, stopping the app if it is invalid.
+    """
+    value = os.getenv(name, default)
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        st.error(f"{name} must be a whole number of at least 1 (got {value!r}).")
+        st.stop()
+    return number
+
+OPENAI_RPM = positive_int_setting("OPENAI_RPM", "500")
+GEMINI_RPM = positive_int_setting("GEMINI_RPM", "60")
+MAX_CONCURRENCY = positive_int_setting("MAX_CONCURRENCY", "8")
+
+# httpx.TransportError covers connections dropping mid-stream, which the SDK does not wrap.
+OPENAI_RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError, httpx.TransportError)
+GEMINI_RETRYABLE = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+BACKOFF = dict(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(6), reraise=True)
+
+AVATARS = {"user": None, "Dr. Nova": "🔵", "Dr. Sage": "🟢"}
+CONCEDES = {"Dr. Nova": NOVA_CONCEDE, "Dr. Sage": SAGE_CONCEDE}
+
+NOVA_SYSTEM_PROMPT = "You are Dr. Nova, a doctoral supervisor. Your persona is sharp, critical, and focused on practical execution. You are debating a student's idea with Dr. Sage."
+SAGE_SYSTEM_PROMPT = "You are Dr. Sage, a doctoral supervisor. Your persona is insightful, constructive, and ever-so-slightly academic. You are debating a student's idea with Dr. Nova."
+
+# ---
+# Summary Schema
+# ---
+
+Score = Literal["1", "2", "3", "4", "5"]
+
+class Rubric(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    publishability: Score
+    distinction_potential: Score
+    data_availability: Score
+    practical_impact: Score
+    methodological_soundness: Score
+    ethical_considerations: Score
+    time_to_completion: Score
+    innovation_revolutionary: Score
+    incremental_contribution: Score
+
+class Summary(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    rubric: Rubric
+    key_points: str
+    advisor_advice: str
+
+# Response format for raw request bodies (e.g. Batch API), where the SDK cannot derive it from Summary.
+SUMMARY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "summary", "strict": True, "schema": Summary.model_json_schema()},
+}
+
+# ---
+# API Clients
+# ---
+
+@st.cache_resource
+def get_openai_client():
+    """
+    Returns a process-wide OpenAI client so its connection pool is reused across turns and reruns.
+    Connections are kept alive for up to 10 minutes so a whole debate shares their TLS sessions.
+    Retries are handled by BACKOFF, so the SDK's own retries are disabled.
+    """
+    return openai.OpenAI(
+        max_retries=0,
+        http_client=openai.DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=600),
+            timeout=60
+        )
+    )
+
+@st.cache_resource
+def configure_gemini():
+    """
+    Configures the Gemini SDK once per process. Reconfiguring on every rerun would drop
+    the SDK's cached clients and their gRPC channels.
+    """
+    genai.configure(api_key=google_api_key, transport="grpc")
+
+@st.cache_resource
+def get_gemini_model(system_instruction=None):
+    """
+    Returns a Gemini model for the given system instruction, built once per process.
+    """
+    return genai.GenerativeModel(SAGE_MODEL, system_instruction=system_instruction)
+
+@st.cache_resource
+def get_self_hosted_client():
+    """
+    Returns a process-wide client for the self-hosted server, keeping its connections alive between turns.
+    """
+    return openai.OpenAI(
+        base_url=SELF_HOSTED_BASE_URL,
+        api_key=os.getenv("DEBATE_LLM_API_KEY", "EMPTY"),
+        max_retries=0,
+        http_client=openai.DefaultHttpxClient(limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300))
+    )
+
+class RateLimiter:
+    """
+    Spaces out calls so that at most rpm of them start per minute.
+    """
+
+    def __init__(self, rpm):
+        self.interval = 60 / rpm
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+@st.cache_resource
+def get_rate_limiter(provider, rpm):
+    """
+    Returns the process-wide rate limiter for an API provider.
+    """
+    return RateLimiter(rpm)
+
+@st.cache_resource
+def get_api_semaphore():
+    """
+    Returns the process-wide semaphore bounding concurrent API calls.
+    """
+    return threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+@contextmanager
+def openai_slot():
+    """
+    Waits for the OpenAI rate limit, then holds a concurrency slot for one request.
+    Every call to OPENAI_CLIENT goes through this so they all share one budget.
+    """
+    get_rate_limiter("openai", OPENAI_RPM).wait()
+    with get_api_semaphore():
+        yield
+
+OPENAI_CLIENT = get_openai_client()
+if not SELF_HOSTED_BASE_URL:
+    configure_gemini()
+
 # ---
 # Helper Function Definitions
 # ---
 
-def ask_openai(messages):
+@retry(retry=retry_if_exception_type(OPENAI_RETRYABLE), **BACKOFF)
+def stream_openai(messages, placeholder, advisor, model):
+    """
+    Streams one OpenAI chat completion into placeholder, throttled and retried on transient errors.
     """
-    Sends a list of messages to the OpenAI API and returns the model's response.
+    if SELF_HOSTED_BASE_URL:
+        # A local server is not bound by OpenAI's rate limits, so it skips the limiter.
+        client, model, slot = get_self_hosted_client(), SELF_HOSTED_MODEL, get_api_semaphore()
+    else:
+        client, slot = OPENAI_CLIENT, openai_slot()
+    concede = CONCEDES[advisor]
+
+    with slot:
+        stream = client.chat.completions.create(model=model, messages=messages, stream=True)
+        response = ""
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            response += delta
+            placeholder.markdown(response)
+            # Only the tail can contain a newly completed concession.
+            if concede in response[-(len(delta) + len(concede)):]:
+                stream.close()
+                break
+        return response
+
+def ask_openai(messages, placeholder, advisor="Dr. Nova", model=None):
+    """
+    Streams the OpenAI API response for a list of messages into placeholder and returns the full text.
     """
     try:
-        # Using the newer client syntax
-        client = openai.OpenAI()
-        resp = client.chat.completions.create(model=NOVA_MODEL, messages=messages)
-        return resp.choices[0].message.content
+        return stream_openai(messages, placeholder, advisor, model or NOVA_MODEL)
     except Exception as e:
         st.error(f"Error with OpenAI API: {e}")
         return None
 
-def ask_gemini(messages):
+@retry(retry=retry_if_exception_type(GEMINI_RETRYABLE), **BACKOFF)
+def stream_gemini(model, history, prompt, placeholder):
+    """
+    Streams one Gemini chat reply into placeholder, throttled and retried on transient errors.
     """
-    Sends a list of messages to the Google Gemini API and returns the model's response.
+    get_rate_limiter("gemini", GEMINI_RPM).wait()
+    with get_api_semaphore():
+        chat = model.start_chat(history=history)
+        response = ""
+        for chunk in chat.send_message(prompt, stream=True):
+            # Chunks carrying only a finish reason or safety block have no text.
+            if not chunk.parts:
+                continue
+            delta = chunk.text
+            response += delta
+            placeholder.markdown(response)
+            # Only the tail can contain a newly completed concession.
+            if SAGE_CONCEDE in response[-(len(delta) + len(SAGE_CONCEDE)):]:
+                break
+        return response
+
+def ask_gemini(messages, placeholder):
+    """
+    Streams the Google Gemini API response for a list of messages into placeholder and returns the full text.
     """
     try:
         # Gemini SDK requires a specific format with history and a current prompt.
-        # The system prompt is added first.
-        gemini_messages = [{"role": "user" if m["role"] == "user" else "model", "parts": [m["content"]]} for m in messages]
-        
+        # A single pass converts the messages and pulls out the system prompt,
+        # which is passed to the model instead of the history.
+        system_instruction, history = None, []
+        for m in messages:
+            if m["role"] == "system":
+                system_instruction = m["content"]
+                continue
+            history.append({"role": "user" if m["role"] == "user" else "model", "parts": [m["content"]]})
+
         # Separate history from the latest message.
-        *history, current_prompt = gemini_messages
-        
-        model = genai.GenerativeModel(SAGE_MODEL)
-        
-        # The system prompt should be passed at the start of the chat.
-        # We find the system message and pass it to start_chat.
-        system_instruction = next((m for m in messages if m['role'] == 'system'), None)
-        
-        if system_instruction:
-            model = genai.GenerativeModel(
-                SAGE_MODEL,
-                system_instruction=system_instruction['content']
-            )
-            # Filter out the system message from the history
-            history = [m for m in history if m.get('role') != 'system']
+        current_prompt = history.pop()
 
-        chat = model.start_chat(history=history)
-        resp = chat.send_message(current_prompt['parts'])
-        return resp.text
+        model = get_gemini_model(system_instruction)
+        return stream_gemini(model, history, current_prompt['parts'], placeholder)
     except Exception as e:
         st.error(f"Error with Google Gemini API: {e}")
         return None
 
 
-def get_joint_summary(conversation_history):
+def with_script_ctx(fn):
     """
-    Requests a joint JSON summary from an AI model after the debate concludes.
+    Wraps fn so it can call Streamlit (e.g. st.error) from a worker thread.
+    """
+    ctx = get_script_run_ctx()
+
+    def wrapper(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def route_nova_model(messages):
+    """
+    Picks Dr. Nova's model for the next round of a transcript (student idea followed by reply pairs).
+    """
+    round_index = (len(messages) - 1) // 2
+    if round_index > 0 and len(messages[-2]["content"]) < NOVA_ESCALATION_MIN_CHARS:
+        return NOVA_MODEL
+    return NOVA_MODELS[min(round_index, len(NOVA_MODELS) - 1)]
+
+
+def debate_round():
+    """
+    Asks Dr. Nova and Dr. Sage for their next reply concurrently, streaming each into its own chat bubble.
+    Both advisors answer the same transcript, so the round costs one network
+    round-trip instead of two. Later rounds cannot be requested up front
+    (e.g. with OpenAI's `n` parameter) because each one answers the previous round.
+    """
+    with st.chat_message("Dr. Nova", avatar="🔵"):
+        nova_placeholder = st.empty()
+    with st.chat_message("Dr. Sage", avatar="🟢"):
+        sage_placeholder = st.empty()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        nova_model = route_nova_model(st.session_state.messages)
+        nova_future = pool.submit(with_script_ctx(ask_openai), st.session_state.openai_buf, nova_placeholder, "Dr. Nova", nova_model)
+        if SELF_HOSTED_BASE_URL:
+            sage_messages = [{"role": "assistant" if m["role"] == "model" else m["role"], "content": m["content"]} for m in st.session_state.gemini_buf]
+            sage_future = pool.submit(with_script_ctx(ask_openai), sage_messages, sage_placeholder, "Dr. Sage")
+        else:
+            sage_future = pool.submit(with_script_ctx(ask_gemini), st.session_state.gemini_buf, sage_placeholder)
+        return nova_future.result(), sage_future.result()
+
+
+@st.cache_data(show_spinner=False, ttl=24*60*60, max_entries=1024)
+@retry(retry=retry_if_exception_type(OPENAI_RETRYABLE), **BACKOFF)
+def summarize_round(round_messages):
+    """
+    Condenses one debate round into a summary of about 30 words.
+    """
+    with openai_slot():
+        response = OPENAI_CLIENT.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": "Summarize each advisor's position in this debate round in at most 30 words. Quote any concession or verdict on the idea's viability word for word."},
+                {"role": "user", "content": "\n".join([f"**{m['role']}:** {m['content']}" for m in round_messages])},
+            ]
+        )
+    return response.choices[0].message.content
+
+
+def condense_transcript(messages):
+    """
+    Returns the transcript to summarize. Long debates are reduced to the student idea plus
+    a short summary per earlier round, with those rounds summarized concurrently. The last
+    round is kept verbatim, since it carries the concession or viability verdict that ended the debate.
+    """
+    transcript = "\n".join([f"**{m['role']}:** {m['content']}" for m in messages])
+    if len(transcript) <= SUMMARY_COMPRESS_CHARS:
+        return transcript
+
+    idea, *replies = messages
+    rounds = [replies[i:i + 2] for i in range(0, len(replies), 2)]
+    if len(rounds) < 2:
+        return transcript
+    *earlier_rounds, last_round = rounds
+    with ThreadPoolExecutor(max_workers=min(len(earlier_rounds), MAX_CONCURRENCY)) as pool:
+        round_summaries = list(pool.map(with_script_ctx(summarize_round), earlier_rounds))
+    return "\n".join(
+        [f"**{idea['role']}:** {idea['content']}"]
+        + [f"**Round {i}:** {summary}" for i, summary in enumerate(round_summaries, 1)]
+        + [f"**{m['role']}:** {m['content']}" for m in last_round]
+    )
+
+
+def summary_request(conversation_history):
+    """
+    Builds the chat completion request (model and messages) for the joint JSON summary.
     """
     summary_prompt = f"""
     Based on the following debate transcript, provide a joint JSON summary in the specified format.
@@ -126,18 +443,112 @@ def get_joint_summary(conversation_history):
       "advisor_advice": "concise guidance for the student"
     }}
     """
-    
+
     # Using OpenAI for the summary as it's generally good with structured data
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo", # Using a reliable model for JSON generation
-            messages=[{"role": "system", "content": summary_prompt}],
-            response_format={"type": "json_object"}
+    return {
+        "model": SUMMARY_MODEL,
+        "messages": [{"role": "system", "content": summary_prompt}],
+    }
+
+
+@st.cache_data(show_spinner=False, ttl=24*60*60, max_entries=128)
+@retry(retry=retry_if_exception_type(OPENAI_RETRYABLE), **BACKOFF)
+def get_joint_summary(conversation_history):
+    """
+    Requests a joint JSON summary from an AI model after the debate concludes.
+    Results are cached by transcript, and errors propagate so failures are not cached.
+    """
+    # The Summary schema constrains decoding server-side, so no free-form JSON needs parsing.
+    with openai_slot():
+        response = OPENAI_CLIENT.chat.completions.parse(**summary_request(conversation_history), response_format=Summary)
+    message = response.choices[0].message
+    if message.parsed is None:
+        raise RuntimeError(message.refusal or "Empty summary response")
+    return message.parsed.model_dump()
+
+
+@retry(retry=retry_if_exception_type(OPENAI_RETRYABLE), **BACKOFF)
+def submit_summary_batch(conversation_history):
+    """
+    Submits the joint summary request to OpenAI's Batch API and returns the batch id.
+    """
+    record = {
+        "custom_id": hashlib.sha256(conversation_history.encode()).hexdigest(),
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {**summary_request(conversation_history), "response_format": SUMMARY_RESPONSE_FORMAT},
+    }
+    with openai_slot():
+        batch_file = OPENAI_CLIENT.files.create(file=("summary.jsonl", orjson.dumps(record)), purpose="batch")
+    with openai_slot():
+        batch = OPENAI_CLIENT.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
         )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        st.error(f"Failed to generate JSON summary: {e}")
-        return None
+    return batch.id
+
+
+class SummaryBatchError(RuntimeError):
+    """
+    The summary batch itself failed, so polling it again cannot succeed and a new batch is needed.
+    """
+
+
+def batch_result_error(result):
+    """
+    Returns the error message of one Batch API result line, or None if the request succeeded.
+    """
+    if result.get("error"):
+        return result["error"].get("message") or result["error"].get("code")
+    response = result.get("response")
+    if not response:
+        return "no response"
+    if response["status_code"] != 200:
+        error = (response.get("body") or {}).get("error") or {}
+        return error.get("message") or f"HTTP {response['status_code']}"
+    return None
+
+
+@retry(retry=retry_if_exception_type(OPENAI_RETRYABLE), **BACKOFF)
+def poll_summary_batch(batch_id):
+    """
+    Returns (status, summary) for a submitted summary batch; summary is None until the batch has completed.
+    Raises SummaryBatchError if the batch cannot yield a summary; other errors leave it worth polling again.
+    """
+    with openai_slot():
+        batch = OPENAI_CLIENT.batches.retrieve(batch_id)
+    if batch.status in ("failed", "expired", "cancelled"):
+        raise SummaryBatchError(f"Summary batch {batch.status}")
+    if batch.status != "completed":
+        return batch.status, None
+    if not batch.output_file_id:
+        if not batch.error_file_id:
+            raise SummaryBatchError(f"Summary batch {batch_id} completed without output")
+        with openai_slot():
+            error_file = OPENAI_CLIENT.files.content(batch.error_file_id)
+        result = orjson.loads(error_file.text.splitlines()[0])
+        raise SummaryBatchError(f"Summary batch request failed: {batch_result_error(result)}")
+
+    with openai_slot():
+        output_file = OPENAI_CLIENT.files.content(batch.output_file_id)
+    result = orjson.loads(output_file.text.splitlines()[0])
+    error = batch_result_error(result)
+    if error:
+        raise SummaryBatchError(f"Summary batch request failed: {error}")
+    content = result["response"]["body"]["choices"][0]["message"]["content"]
+    try:
+        return batch.status, Summary.model_validate_json(content).model_dump()
+    except ValidationError as e:
+        raise SummaryBatchError(f"Summary batch returned an invalid summary: {e}") from e
+
+
+@st.cache_data(show_spinner=False)
+def format_rubric(rubric_items):
+    """
+    Returns the rubric scores as a single markdown list.
+    """
+    return "\n".join(f"- **{key.replace('_', ' ').title()}:** {value}/5" for key, value in rubric_items)
 
 
 # ---
@@ -147,7 +558,7 @@ def get_joint_summary(conversation_history):
 st.title("🎓 Dual-AI Dissertation Debate")
 
 # Add a simple status indicator
-if openai.api_key and google_api_key:
+if api_keys_configured:
     st.success("✅ API keys configured successfully")
 else:
     st.warning("⚠️ API keys not configured - app will not function properly")
@@ -155,86 +566,111 @@ else:
 # Initialize session state for conversation
 if 'messages' not in st.session_state:
     st.session_state.messages = []
-if 'debate_ended' not in st.session_state:
-    st.session_state.debate_ended = False
+# The debate advances one round per script run: "student" waits for the idea,
+# "advisors" runs the next round, and "done" moves on to the summary.
+if 'turn' not in st.session_state:
+    st.session_state.turn = "student"
+# Each advisor's view of the transcript, translated once per message rather than rebuilt every round.
+# Both replies of a round are written at the same time, so an advisor's own reply is placed
+# before the other's to keep its history alternating.
+if 'openai_buf' not in st.session_state:
+    st.session_state.openai_buf = [{"role": "system", "content": NOVA_SYSTEM_PROMPT}]
+if 'gemini_buf' not in st.session_state:
+    st.session_state.gemini_buf = [{"role": "system", "content": SAGE_SYSTEM_PROMPT}]
 
 # Display chat history
 for message in st.session_state.messages:
-    if message["role"] == "user":
-        with st.chat_message("user"):
-            st.markdown(message["content"])
-    elif message["role"] == "Dr. Nova":
-        with st.chat_message("Dr. Nova", avatar="🔵"):
-            st.markdown(f'<span style="color:blue">**Dr. Nova:**</span> {message["content"]}', unsafe_allow_html=True)
-    elif message["role"] == "Dr. Sage":
-        with st.chat_message("Dr. Sage", avatar="🟢"):
-            st.markdown(f'<span style="color:green">**Dr. Sage:**</span> {message["content"]}', unsafe_allow_html=True)
+    with st.chat_message(message["role"], avatar=AVATARS[message["role"]]):
+        st.markdown(message["content"])
 
 
 # User input
-if not st.session_state.debate_ended:
+if st.session_state.turn == "student":
     if user_input := st.chat_input("Enter your dissertation idea..."):
         # Add user idea to chat
         st.session_state.messages.append({"role": "user", "content": f"Student Idea: {user_input}"})
-        with st.chat_message("user"):
-            st.markdown(f"Student Idea: {user_input}")
-
-        # Start the debate
-        turn = "nova"
-        while not st.session_state.debate_ended:
-            if turn == "nova":
-                with st.chat_message("Dr. Nova", avatar="🔵"):
-                    with st.spinner("Dr. Nova is thinking..."):
-                        # Prepare messages for OpenAI
-                        openai_messages = [{"role": "system", "content": "You are Dr. Nova, a doctoral supervisor. Your persona is sharp, critical, and focused on practical execution. You are debating a student's idea with Dr. Sage."}]
-                        openai_messages += [{"role": "user" if m["role"] == "user" else "assistant", "content": m["content"]} for m in st.session_state.messages]
-                        
-                        response = ask_openai(openai_messages)
-                        if response:
-                            st.session_state.messages.append({"role": "Dr. Nova", "content": response})
-                            st.markdown(f'<span style="color:blue">**Dr. Nova:**</span> {response}', unsafe_allow_html=True)
-                            if NOVA_CONCEDE in response:
-                                st.session_state.debate_ended = True
-                        else:
-                            st.session_state.debate_ended = True # Stop if API fails
-                turn = "sage"
-
-            elif turn == "sage":
-                with st.chat_message("Dr. Sage", avatar="🟢"):
-                    with st.spinner("Dr. Sage is thinking..."):
-                        # Prepare messages for Gemini
-                        gemini_messages = [{"role": "system", "content": "You are Dr. Sage, a doctoral supervisor. Your persona is insightful, constructive, and ever-so-slightly academic. You are debating a student's idea with Dr. Nova."}]
-                        gemini_messages += [{"role": "user" if m["role"] in ["user", "Dr. Nova"] else "model", "content": m["content"]} for m in st.session_state.messages]
-
-                        response = ask_gemini(gemini_messages)
-                        if response:
-                            st.session_state.messages.append({"role": "Dr. Sage", "content": response})
-                            st.markdown(f'<span style="color:green">**Dr. Sage:**</span> {response}', unsafe_allow_html=True)
-                            if SAGE_CONCEDE in response:
-                                st.session_state.debate_ended = True
-                turn = "nova"
-            
-            # Simple check for mutual rejection
-            if len(st.session_state.messages) > 2:
-                last_two_responses = " ".join([m['content'] for m in st.session_state.messages[-2:]])
-                if "not viable" in last_two_responses.lower() or "unviable" in last_two_responses.lower():
-                    st.warning("Both advisors seem to find the idea unviable.")
-                    st.session_state.debate_ended = True
-
-# After debate ends, generate and display summary
-if st.session_state.debate_ended and 'summary' not in st.session_state:
-    with st.spinner("Generating final summary..."):
-        conversation_transcript = "\n".join([f"**{m['role']}:** {m['content']}" for m in st.session_state.messages])
-        summary = get_joint_summary(conversation_transcript)
-        st.session_state.summary = summary
-
-if 'summary' in st.session_state and st.session_state.summary:
+        st.session_state.openai_buf.append({"role": "user", "content": f"Student Idea: {user_input}"})
+        st.session_state.gemini_buf.append({"role": "user", "content": f"Student Idea: {user_input}"})
+        st.session_state.turn = "advisors"
+        st.rerun()
+
+# Debate: one round per run, so every round is committed and the user can stop in between
+elif st.session_state.turn == "advisors":
+    stop = st.empty()
+    if stop.button("Stop debate"):
+        st.session_state.turn = "done"
+        stop.empty()
+    else:
+        nova_response, sage_response = debate_round()
+
+        if nova_response:
+            st.session_state.messages.append({"role": "Dr. Nova", "content": nova_response})
+            st.session_state.openai_buf.append({"role": "assistant", "content": nova_response})
+        if sage_response:
+            st.session_state.messages.append({"role": "Dr. Sage", "content": sage_response})
+            st.session_state.openai_buf.append({"role": "user", "content": sage_response})
+            st.session_state.gemini_buf.append({"role": "model", "content": sage_response})
+        if nova_response:  # after Sage's own reply in Sage's view
+            st.session_state.gemini_buf.append({"role": "user", "content": nova_response})
+
+        if not nova_response or not sage_response:
+            st.session_state.turn = "done" # Stop if API fails
+
+        # Simple check for a concession or mutual rejection
+        if len(st.session_state.messages) > 2:
+            last_two = st.session_state.messages[-2:]
+            if any(UNVIABLE_RE.search(m['content']) for m in last_two):
+                st.warning("Both advisors seem to find the idea unviable.")
+                st.session_state.turn = "done"
+            elif any(CONCEDE_RE.search(m['content']) for m in last_two):
+                st.session_state.turn = "done"
+
+        # A finished debate falls through to the summary so errors and warnings stay visible.
+        if st.session_state.turn == "advisors":
+            st.rerun()
+        stop.empty()
+
+# After debate ends, generate and display summary.
+# st.session_state.summary is "pending" while a request is in flight, the summary dict on
+# success, or "failed"; a failed summary is only retried on request, not on every rerun.
+if st.session_state.turn == "done" and ('summary' not in st.session_state or st.session_state.summary == "pending"):
+    st.session_state.summary = "pending"
+    if SUMMARY_VIA_BATCH:
+        try:
+            if 'summary_batch_id' not in st.session_state:
+                st.session_state.summary_batch_id = submit_summary_batch(condense_transcript(st.session_state.messages))
+            status, summary = poll_summary_batch(st.session_state.summary_batch_id)
+        except Exception as e:
+            st.error(f"Failed to generate JSON summary: {e}")
+            st.session_state.summary = "failed"
+            # Keep a batch that may still be running (e.g. polling hit a network error); retrying polls it again.
+            if isinstance(e, SummaryBatchError):
+                del st.session_state.summary_batch_id
+        else:
+            if summary is None:
+                # Poll again on the next rerun until the batch finishes.
+                st.info(f"⏳ Final summary queued with the OpenAI Batch API (status: {status}).")
+                time.sleep(BATCH_POLL_SECONDS)
+                st.rerun()
+            st.session_state.summary = summary
+    else:
+        with st.spinner("Generating final summary..."):
+            try:
+                st.session_state.summary = get_joint_summary(condense_transcript(st.session_state.messages))
+            except Exception as e:
+                st.error(f"Failed to generate JSON summary: {e}")
+                st.session_state.summary = "failed"
+
+if st.session_state.get('summary') == "failed":
+    if st.button("Retry summary"):
+        del st.session_state.summary
+        st.rerun()
+elif isinstance(st.session_state.get('summary'), dict):
     st.subheader("Joint Summary")
     summary_data = st.session_state.summary
     
     st.markdown("### Rubric")
-    for key, value in summary_data.get("rubric", {}).items():
-        st.markdown(f"- **{key.replace('_', ' ').title()}:** {value}/5")
+    st.markdown(format_rubric(tuple(summary_data.get("rubric", {}).items())))
 
     st.markdown("### Key Points")
     st.markdown(summary_data.get("key_points", "Not available."))